@@ -4,13 +4,15 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
-from data_loader import load_all_data
-from model import train_delay_model
+from data_loader import load_all_data, source_signature
+from model import get_delay_model
 
 st.set_page_config(page_title="NexGen Logistics AI Platform", layout="wide")
 
 # ✨ GLOBAL THEME + ANIMATIONS
-st.markdown("""
+# Streamlit clears the page and re-executes this script on every rerun, so the
+# stylesheet is emitted each run; the constant is only for readability
+CSS = """
 <style>
 /* Global font */
 html, body, [class*="css"]  {
@@ -84,12 +86,61 @@ h1, h2, h3 {
     animation: fadeInUp 0.5s ease-out;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+KPI_CARD = """
+<div class="kpi-card">
+    <h4>{title}</h4>
+    <h1>{value}</h1>
+    <p>{caption}</p>
+</div>
+"""
+
+st.markdown(CSS, unsafe_allow_html=True)
 
 st.title("🚚 NexGen Logistics – Predictive & Prescriptive AI Platform")
 
+# Derived-data caches are keyed on the source signature and take the frame as
+# _df, which Streamlit leaves unhashed; hashing the full merged frame on every
+# rerun would cost more than the aggregates it saves. _df must be the frame
+# returned by load_all_data() for that same signature.
+@st.cache_data(show_spinner=False)
+def overview_stats(signature, _df):
+    return {
+        "total_orders": len(_df),
+        "delay_rate": (_df["actual_delivery_days"] > _df["expected_delivery_days"]).mean() * 100,
+        "avg_cost": _df["total_cost"].mean(),
+        # Bin server-side so the chart ships 20 bars instead of every order
+        "delay_histogram": np.histogram(_df["delay_days"].dropna().to_numpy(), bins=20),
+    }
+
+@st.cache_data(show_spinner=False)
+def cost_heatmap(signature, _df):
+    return _df.pivot_table(
+        values="total_cost",
+        index="origin",
+        columns="destination",
+        aggfunc="mean",
+        observed=True
+    )
+
+@st.cache_data(show_spinner=False)
+def cost_by(signature, _df, column):
+    summary = _df.groupby(column, observed=True, sort=False)["total_cost"].mean()
+    # Order the handful of aggregated rows for the chart, not the input rows
+    return summary.reset_index().sort_values(column, ignore_index=True)
+
+def column_or_default(df, name, default):
+    # Unlike df.get, only builds the fallback array when the column is missing
+    if name in df.columns:
+        return df[name].to_numpy()
+    return np.full(len(df), default, dtype=np.float32)
+
 # Load Data
-df = load_all_data()
+# One signature keys both the loaded frame and everything derived from it, so
+# a derived cache entry can never be filled from a stale frame
+data_signature = source_signature()
+df = load_all_data(data_signature)
 
 # Sidebar
 menu = st.sidebar.radio(
@@ -109,46 +160,29 @@ menu = st.sidebar.radio(
 if menu == "Executive Overview":
     st.markdown("## 📊 Executive Command Center")
 
-    total_orders = len(df)
-    delay_rate = (df["actual_delivery_days"] > df["expected_delivery_days"]).mean() * 100
-    avg_cost = df["total_cost"].mean()
+    stats = overview_stats(data_signature, df)
+    total_orders = stats["total_orders"]
+    delay_rate = stats["delay_rate"]
+    avg_cost = stats["avg_cost"]
 
     # ✨ Beautiful KPI Cards
     c1, c2, c3 = st.columns(3)
 
     with c1:
         st.markdown(
-            f"""
-            <div class="kpi-card">
-                <h4>📦 Total Orders</h4>
-                <h1>{total_orders}</h1>
-                <p>Across all warehouses</p>
-            </div>
-            """,
+            KPI_CARD.format(title="📦 Total Orders", value=total_orders, caption="Across all warehouses"),
             unsafe_allow_html=True
         )
 
     with c2:
         st.markdown(
-            f"""
-            <div class="kpi-card">
-                <h4>⏱ Delay Rate</h4>
-                <h1>{delay_rate:.1f}%</h1>
-                <p>Orders missing SLA</p>
-            </div>
-            """,
+            KPI_CARD.format(title="⏱ Delay Rate", value=f"{delay_rate:.1f}%", caption="Orders missing SLA"),
             unsafe_allow_html=True
         )
 
     with c3:
         st.markdown(
-            f"""
-            <div class="kpi-card">
-                <h4>💰 Avg Cost / Order</h4>
-                <h1>₹{avg_cost:.0f}</h1>
-                <p>End-to-end logistics</p>
-            </div>
-            """,
+            KPI_CARD.format(title="💰 Avg Cost / Order", value=f"₹{avg_cost:.0f}", caption="End-to-end logistics"),
             unsafe_allow_html=True
         )
 
@@ -156,16 +190,17 @@ if menu == "Executive Overview":
     
     # 📉 Interactive Delay Distribution
     st.markdown("### 📉 Delay Pattern Analysis")
-    df["delay_days"] = df["actual_delivery_days"] - df["expected_delivery_days"]
-    
-    fig = px.histogram(
-        df,
-        x="delay_days",
-        nbins=20,
-        color_discrete_sequence=["#6366f1"],
-        title="Delivery Delay Distribution (Days)"
-    )
+    counts, edges = stats["delay_histogram"]
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color="#6366f1"
+    ))
     fig.update_layout(
+        title="Delivery Delay Distribution (Days)",
+        xaxis_title="delay_days",
+        yaxis_title="count",
         plot_bgcolor="#020617",
         paper_bgcolor="#020617",
         font_color="white"
@@ -177,16 +212,16 @@ if menu == "Executive Overview":
 elif menu == "Delivery Risk Predictor":
     st.header("⏱ Predictive Delivery Risk Engine")
 
-    model, features, encoders, metrics = train_delay_model(df)
+    model, features, categories, metrics = get_delay_model(df)
 
     # Prepare input data with proper encoding
     input_data = df[features].dropna().head(1).copy()
-    for col in encoders:
+    for col in categories:
         if col in input_data.columns:
-            input_data[col] = encoders[col].transform(input_data[col])
+            input_data[col] = input_data[col].astype(pd.CategoricalDtype(categories[col])).cat.codes
     
     # Ensure all numeric
-    input_data = input_data.astype(float)
+    input_data = input_data.astype(np.float32)
 
     if st.button("Predict Delivery Risk for Sample Order"):
         if len(input_data) > 0:
@@ -245,7 +280,7 @@ elif menu == "Delivery Risk Predictor":
 elif menu == "Model Performance":
     st.header("📈 Model Performance & Explainability")
 
-    model, features, encoders, metrics = train_delay_model(df)
+    model, features, categories, metrics = get_delay_model(df)
 
     col1, col2 = st.columns(2)
     col1.metric("Model Accuracy", f"{metrics['accuracy']*100:.2f}%")
@@ -292,10 +327,12 @@ elif menu == "Fleet Optimization":
 
     # Use order_id count grouped by carrier if vehicle_id doesn't exist
     if "vehicle_id" in df.columns:
-        fleet_util = df.groupby("vehicle_id")["order_id"].count().reset_index()
+        fleet_util = df.groupby("vehicle_id", observed=True, sort=False)["order_id"].count()
+        fleet_util = fleet_util.reset_index().sort_values("vehicle_id", ignore_index=True)
         fleet_util.columns = ["Vehicle", "Assigned Orders"]
     elif "carrier" in df.columns:
-        fleet_util = df.groupby("carrier")["order_id"].count().reset_index()
+        fleet_util = df.groupby("carrier", observed=True, sort=False)["order_id"].count()
+        fleet_util = fleet_util.reset_index().sort_values("carrier", ignore_index=True)
         fleet_util.columns = ["Carrier", "Assigned Orders"]
     else:
         fleet_util = df[["order_id"]].head(10)
@@ -313,12 +350,7 @@ elif menu == "Cost Intelligence":
     if "origin" in df.columns and "destination" in df.columns:
         st.markdown("### 🔥 Cost Hotspots")
         
-        heat = df.pivot_table(
-            values="total_cost",
-            index="origin",
-            columns="destination",
-            aggfunc="mean"
-        )
+        heat = cost_heatmap(data_signature, df)
         
         fig = px.imshow(
             heat,
@@ -336,7 +368,7 @@ elif menu == "Cost Intelligence":
     
     # Interactive cost chart
     if "route" in df.columns:
-        cost_summary = df.groupby("route")["total_cost"].mean().reset_index()
+        cost_summary = cost_by(data_signature, df, "route")
         
         fig = px.bar(
             cost_summary,
@@ -353,7 +385,7 @@ elif menu == "Cost Intelligence":
         )
         st.plotly_chart(fig, use_container_width=True)
     elif "carrier" in df.columns:
-        cost_summary = df.groupby("carrier")["total_cost"].mean().reset_index()
+        cost_summary = cost_by(data_signature, df, "carrier")
         
         fig = px.bar(
             cost_summary,
@@ -376,25 +408,30 @@ elif menu == "Cost Intelligence":
 elif menu == "Customer Experience":
     st.header("😊 Customer Churn Risk Monitor")
 
-    churn = df.groupby("customer_id")["feedback_score"].mean().reset_index()
-    
-    # Handle NaN values aggressively
-    churn = churn.dropna()
-    churn["Churn Risk"] = np.where(churn["feedback_score"] < 3, "High", "Low")
-    churn["risk_score"] = (5 - churn["feedback_score"]).fillna(2.5).abs() + 0.5
-    
-    # Remove any remaining NaN or invalid values
-    churn = churn[churn["risk_score"].notna()]
-    churn = churn[np.isfinite(churn["risk_score"])]
+    scores = df.groupby("customer_id", observed=True, sort=False)["feedback_score"].mean()
+
+    # Score customers in one numpy pass, skipping those without valid feedback
+    values = scores.to_numpy()
+    valid = np.isfinite(values)
+    values = values[valid]
+    churn = pd.DataFrame({
+        "customer_id": scores.index.to_numpy()[valid],
+        "feedback_score": values,
+        "Churn Risk": np.where(values < 3, "High", "Low"),
+        "risk_score": np.abs(5 - values) + 0.5
+    })
+    # Sort the aggregated rows so the table shows the first customers by id
+    churn = churn.sort_values("customer_id", ignore_index=True)
 
     # 🚥 Traffic Light UI - Interactive Scatter
-    if len(churn) > 0 and churn["risk_score"].notna().all():
+    if len(churn) > 0:
         fig = px.scatter(
             churn,
             x="feedback_score",
             y="risk_score",
             size="risk_score",
             color="Churn Risk",
+            render_mode="webgl",
             title="Customer Churn Risk Landscape",
             color_discrete_map={
                 "High": "#ef4444",
@@ -420,8 +457,8 @@ elif menu == "Sustainability Tracker":
 
     # ✅ IMPROVEMENT 2: Protect calculation with safe defaults
     df["estimated_co2"] = (
-        df.get("route_distance_km", pd.Series([100] * len(df))) * 
-        df.get("fuel_consumption_rate", pd.Series([5] * len(df)))
+        column_or_default(df, "route_distance_km", 100) *
+        column_or_default(df, "fuel_consumption_rate", 5)
     )
 
     st.metric(
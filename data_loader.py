@@ -1,12 +1,37 @@
+import os
+import hashlib
 import pandas as pd
+import numpy as np
+import streamlit as st
+
+# Columns the dashboard and model rely on: (column, source columns to copy it
+# from in order of preference, fallback value when none of them exist)
+DEFAULTS = [
+    ("route_distance_km", ["distance_km"], 100),
+    ("vehicle_capacity", [], 1000),
+    ("warehouse_load", [], 50),
+    ("delivery_priority", ["priority"], "medium"),
+    ("fuel_cost", [], 500),
+    ("maintenance_cost", ["vehicle_maintenance"], 200),
+    ("actual_delivery_days", [], 5),
+    ("expected_delivery_days", ["promised_delivery_days"], 3),
+    ("feedback_score", ["rating"], 3),
+    ("fuel_consumption_rate", ["fuel_consumption_l"], 5),
+]
+
+# Low-cardinality labels stored as pandas categories instead of strings
+CATEGORICAL_COLUMNS = [
+    "customer_segment",
+    "route",
+    "priority",
+    "delivery_priority",
+    "carrier",
+    "origin",
+    "destination"
+]
 
 def standardize_columns(df):
-    df.columns = (
-        df.columns
-        .str.strip()
-        .str.lower()
-        .str.replace(" ", "_")
-    )
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
     return df
 
 def auto_rename_id(df, possible_names, standard_name):
@@ -16,14 +41,27 @@ def auto_rename_id(df, possible_names, standard_name):
             return df
     return df
 
-def load_all_data():
-    orders = standardize_columns(pd.read_csv("data/orders.csv"))
-    delivery = standardize_columns(pd.read_csv("data/delivery_performance.csv"))
-    routes = standardize_columns(pd.read_csv("data/routes_distance.csv"))
-    vehicles = standardize_columns(pd.read_csv("data/vehicle_fleet.csv"))
-    costs = standardize_columns(pd.read_csv("data/cost_breakdown.csv"))
-    warehouse = standardize_columns(pd.read_csv("data/warehouse_inventory.csv"))
-    feedback = standardize_columns(pd.read_csv("data/customer_feedback.csv"))
+def source_signature():
+    # Cheap cache key for results derived from load_all_data(): it changes when
+    # any source CSV is edited or replaced, without reading or hashing rows
+    stats = [
+        (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in sorted(os.scandir("data"), key=lambda e: e.name)
+        if entry.name.endswith(".csv")
+    ]
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+# signature is only the cache key: pass source_signature() so edits to the
+# CSVs invalidate the cached frame on the next rerun
+@st.cache_data(show_spinner=False)
+def load_all_data(signature=None):
+    orders = standardize_columns(pd.read_csv("data/orders.csv", engine="pyarrow"))
+    delivery = standardize_columns(pd.read_csv("data/delivery_performance.csv", engine="pyarrow"))
+    routes = standardize_columns(pd.read_csv("data/routes_distance.csv", engine="pyarrow"))
+    vehicles = standardize_columns(pd.read_csv("data/vehicle_fleet.csv", engine="pyarrow"))
+    costs = standardize_columns(pd.read_csv("data/cost_breakdown.csv", engine="pyarrow"))
+    warehouse = standardize_columns(pd.read_csv("data/warehouse_inventory.csv", engine="pyarrow"))
+    feedback = standardize_columns(pd.read_csv("data/customer_feedback.csv", engine="pyarrow"))
 
     # -------- AUTO RENAME IDS --------
     orders = auto_rename_id(orders, ["orderid", "order_id"], "order_id")
@@ -41,15 +79,29 @@ def load_all_data():
     
     # Create customer_id from customer_segment for proper data modeling
     if "customer_segment" in orders.columns and "customer_id" not in orders.columns:
-        orders["customer_id"] = orders["customer_segment"] + "_" + orders["order_id"].astype(str).str[-4:]
+        # Build the short "_1234" suffix first so the long segment strings are
+        # only concatenated once
+        order_suffix = "_" + orders["order_id"].astype(str).str[-4:]
+        orders["customer_id"] = orders["customer_segment"] + order_suffix
 
     # -------- MERGES --------
-    df = orders.merge(delivery, on="order_id", how="left")
-    
-    # ✅ FIX 1: Join routes on both order_id AND route (to get route distance data)
-    df = df.merge(routes, on="order_id", how="left")
-    
-    df = df.merge(costs, on="order_id", how="left")
+    order_tables = [delivery, routes, costs]
+    column_names = [
+        c for table in [orders] + order_tables for c in table.columns if c != "order_id"
+    ]
+    if len(column_names) == len(set(column_names)):
+        # Index the order-level tables on order_id once and join them in a single
+        # pass, rather than rehashing the key and copying the frame for each merge
+        df = orders.set_index("order_id").join(
+            [table.set_index("order_id") for table in order_tables],
+            how="left"
+        ).reset_index()
+    else:
+        # A multi-frame join can't suffix overlapping column names, so swapped-in
+        # sources that share one fall back to chained merges (_x/_y suffixes)
+        df = orders
+        for table in order_tables:
+            df = df.merge(table, on="order_id", how="left")
     
     # ✅ FIX 2: Join feedback on customer_id (customer-level data)
     # First, add customer_id to feedback based on order mapping
@@ -65,41 +117,11 @@ def load_all_data():
         df = df.merge(feedback, on="order_id", how="left")
     
     # ✅ IMPROVEMENT 1: Avoid silent overwrites - check before setting defaults
-    if "route_distance_km" not in df.columns:
-        if "distance_km" in df.columns:
-            df["route_distance_km"] = df["distance_km"]
-        else:
-            df["route_distance_km"] = 100
-    
-    if "vehicle_capacity" not in df.columns:
-        df["vehicle_capacity"] = 1000
-    
-    if "warehouse_load" not in df.columns:
-        df["warehouse_load"] = 50
-    
-    if "delivery_priority" not in df.columns:
-        if "priority" in df.columns:
-            df["delivery_priority"] = df["priority"]
-        else:
-            df["delivery_priority"] = "medium"
-    
-    if "fuel_cost" not in df.columns:
-        df["fuel_cost"] = 500
-    
-    if "maintenance_cost" not in df.columns:
-        if "vehicle_maintenance" in df.columns:
-            df["maintenance_cost"] = df["vehicle_maintenance"]
-        else:
-            df["maintenance_cost"] = 200
-    
-    if "actual_delivery_days" not in df.columns:
-        df["actual_delivery_days"] = 5
-    
-    if "expected_delivery_days" not in df.columns:
-        if "promised_delivery_days" in df.columns:
-            df["expected_delivery_days"] = df["promised_delivery_days"]
-        else:
-            df["expected_delivery_days"] = 3
+    for column, aliases, default in DEFAULTS:
+        if column in df.columns:
+            continue
+        source = next((alias for alias in aliases if alias in df.columns), None)
+        df[column] = df[source] if source else np.full(len(df), default)
     
     if "total_cost" not in df.columns:
         cost_columns = [c for c in df.columns if 'cost' in c.lower() or 'charge' in c.lower()]
@@ -107,17 +129,17 @@ def load_all_data():
             df["total_cost"] = df[cost_columns].sum(axis=1, skipna=True)
         else:
             df["total_cost"] = 1000
-    
-    if "feedback_score" not in df.columns:
-        if "rating" in df.columns:
-            df["feedback_score"] = df["rating"]
-        else:
-            df["feedback_score"] = 3
-    
-    if "fuel_consumption_rate" not in df.columns:
-        if "fuel_consumption_l" in df.columns:
-            df["fuel_consumption_rate"] = df["fuel_consumption_l"]
-        else:
-            df["fuel_consumption_rate"] = 5
+
+    df["delay_days"] = df["actual_delivery_days"] - df["expected_delivery_days"]
+
+    # Narrow dtypes on the final frame so groupby, pivot and mean scan half
+    # the bytes; downstream charts and the model don't need 64-bit precision
+    float_columns = df.select_dtypes("float64").columns
+    df[float_columns] = df[float_columns].astype("float32")
+    for col in df.select_dtypes("int64").columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
 
     return df
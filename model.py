@@ -1,41 +1,105 @@
+import os
+import hashlib
+import tempfile
+import joblib
+import sklearn
 import pandas as pd
 import numpy as np
+import streamlit as st
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, roc_auc_score, confusion_matrix
 
-def train_delay_model(df):
-    df = df.copy()
+FEATURES = [
+    "route_distance_km",
+    "vehicle_capacity",
+    "warehouse_load",
+    "delivery_priority",
+    "fuel_cost",
+    "maintenance_cost"
+]
 
-    df["delayed"] = (df["actual_delivery_days"] > df["expected_delivery_days"]).astype(int)
+# Trained models are persisted here so cold starts can skip fitting
+MODEL_DIR = "models"
+# Bump whenever training changes so models saved by older code are ignored
+MODEL_VERSION = 3
+# Larger datasets are trained on a stratified sample of this many rows; a
+# six-feature model gains little accuracy from more data, only fit time
+MAX_TRAIN_ROWS = 50000
 
-    features = [
-        "route_distance_km",
-        "vehicle_capacity",
-        "warehouse_load",
-        "delivery_priority",
-        "fuel_cost",
-        "maintenance_cost"
-    ]
+def data_signature(df):
+    columns = FEATURES + ["actual_delivery_days", "expected_delivery_days"]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
 
-    # Create a copy with only needed features
-    df_model = df[features + ["delayed"]].copy()
-    df_model = df_model.dropna()
+def get_delay_model(df):
+    # Key the cache on the training-data signature so every tab shares one
+    # fitted model without Streamlit hashing the whole merged frame
+    return load_or_train_delay_model(data_signature(df), df)
+
+# Fitted estimators are stateful and unhashable, so keep one instance per
+# dataset across reruns instead of memoizing a copy like st.cache_data would.
+# The leading underscore tells Streamlit not to hash _df.
+@st.cache_resource(show_spinner=False)
+def load_or_train_delay_model(signature, _df):
+    # Pickled estimators aren't portable across scikit-learn releases, so the
+    # library version is part of the name alongside MODEL_VERSION
+    path = os.path.join(
+        MODEL_DIR,
+        f"delay_model_v{MODEL_VERSION}_sklearn{sklearn.__version__}_{signature}.joblib"
+    )
+    if os.path.exists(path):
+        try:
+            return joblib.load(path)
+        except Exception:
+            # Unreadable or corrupt file: discard it and retrain below
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
-    # Store encoders for later use
-    encoders = {}
-    for col in df_model.select_dtypes(include="object").columns:
-        enc = LabelEncoder()
-        df_model[col] = enc.fit_transform(df_model[col])
-        encoders[col] = enc
+    result = train_delay_model(_df)
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        # Write to a temp file and rename it into place so a crash mid-dump
+        # never leaves a truncated model at path
+        fd, tmp_path = tempfile.mkstemp(dir=MODEL_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            joblib.dump(result, tmp_path, compress=3)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    except OSError:
+        # Read-only deployments still work, they just retrain on cold start
+        pass
+    return result
 
-    # Ensure all features are numeric
-    for col in features:
-        df_model[col] = pd.to_numeric(df_model[col], errors="coerce")
+def train_delay_model(df):
+    features = FEATURES
+
+    # Project onto the model columns before doing any work, so only these
+    # few columns are copied rather than the whole merged frame
+    df_model = df[features].copy()
+    df_model["delayed"] = (df["actual_delivery_days"] > df["expected_delivery_days"]).astype(np.int8)
     df_model = df_model.dropna()
 
-    X = df_model[features]
+    # Category codes replace label encoding; keep the categories so
+    # prediction inputs can be mapped onto the same codes
+    categories = {}
+    for col in df_model.select_dtypes(include="category").columns:
+        categories[col] = df_model[col].cat.categories
+        df_model[col] = df_model[col].cat.codes.astype("int16")
+
+    if len(df_model) > MAX_TRAIN_ROWS:
+        df_model = df_model.groupby("delayed", group_keys=False).sample(
+            frac=MAX_TRAIN_ROWS / len(df_model), random_state=42
+        )
+
+    # The forest's tree builder works on float32 internally; converting once
+    # here saves a copy on every fit/predict call
+    X = df_model[features].astype(np.float32)
     y = df_model["delayed"]
 
     X_train, X_test, y_train, y_test = train_test_split(
@@ -46,8 +110,10 @@ def train_delay_model(df):
         n_estimators=300,
         max_depth=10,
         min_samples_leaf=5,
+        max_features="sqrt",
         random_state=42,
-        class_weight="balanced"
+        class_weight="balanced",
+        n_jobs=-1
     )
 
     model.fit(X_train, y_train)
@@ -64,4 +130,4 @@ def train_delay_model(df):
         ).sort_values(ascending=False)
     }
 
-    return model, features, encoders, metrics
+    return model, features, categories, metrics